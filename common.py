@@ -18,6 +18,12 @@ READ_MULTIPLE = [0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
 OUTPUT_FOLDER = os.path.join(HOME, "DRAMSys", "configs", "traces", "synthetic")
 # Output file path.
 OUTPUT = os.path.join(OUTPUT_FOLDER, "synthetic.stl")
+# Merged multi-core output file path, kept apart from the output folder so it is not picked up as another trace.
+MERGED = os.path.join(HOME, "DRAMSys", "configs", "traces", "multicore", "merged.stl")
+# Megabytes to rebase each merged process by so their address spaces do not overlap, with zero disabling it.
+REBASE = 0
+# Target requests per clock cycle for each merged process, with zero keeping the original timestamps.
+RATE = 0
 # Random generation seed.
 SEED = 42
 # Multiple random generation seeds.
@@ -0,0 +1,141 @@
+import argparse
+import heapq
+import logging
+import os
+import re
+from contextlib import ExitStack
+from typing import Iterator, TextIO
+
+from common import LEVEL, logs, MERGED, RATE, REBASE
+
+# A regular expression to parse the lines of a DRAMSys trace.
+# It captures the timestamp, the operation, the hex address, and anything after it such as data.
+trace_pattern = re.compile(r"^\s*(\d+):\s*(read|write)\s+0x([0-9a-fA-F]+)(.*)$")
+
+
+def read_trace(
+        f: TextIO,
+        process: int = 0,
+        rebase: int = REBASE,
+        rate: float = RATE
+) -> Iterator[tuple[int, int, str, int, str]]:
+    """
+    Lazily read the requests of a trace so only a single line is held in memory at a time.
+    :param f: The open trace file.
+    :type f: TextIO
+    :param process: The index of the process this trace represents.
+    :type process: int
+    :param rebase: Megabytes to rebase the addresses of each process by, with zero disabling it.
+    :type rebase: int
+    :param rate: Target requests per clock cycle, timing each request by its index, with zero keeping the originals.
+    :type rate: float
+    :return: The timestamp, process, operation, address, and any trailing data of each request.
+    :rtype: Iterator[tuple[int, int, str, int, str]]
+    """
+    offset = process * rebase * 1024 * 1024
+    index = 0
+    previous = 0
+    ordered = True
+    for line in f:
+        # Ignore comment lines.
+        if line.strip().startswith("#"):
+            continue
+        match = trace_pattern.match(line)
+        if not match:
+            if line.strip():
+                logging.debug(f"Skipping unrecognized line in process {process}: {line.strip()}")
+            continue
+        timestamp = int(match.group(1))
+        # The merge requires each trace to be in order, which only matters when keeping the original timestamps.
+        if rate <= 0 and ordered and timestamp < previous:
+            ordered = False
+            logging.warning(f"Timestamps of process {process} go backwards from {previous} to {timestamp}; "
+                            f"the merged trace will not be in order.")
+        previous = max(previous, timestamp)
+        # Spread the requests out by their index so each process issues at the requested rate.
+        if rate > 0:
+            timestamp = round(index / rate)
+        index += 1
+        yield timestamp, process, match.group(2), int(match.group(3), 16) + offset, match.group(4)
+
+
+def merge_traces(
+        traces: list[str],
+        output: str = MERGED,
+        rebase: int = REBASE,
+        rate: float = RATE
+) -> bool:
+    """
+    Interleave multiple traces by timestamp into a single multi-core trace.
+    :param traces: The traces to merge.
+    :type traces: list[str]
+    :param output: Output file path.
+    :type output: str
+    :param rebase: Megabytes to rebase the addresses of each process by, with zero disabling it.
+    :type rebase: int
+    :param rate: Target requests per clock cycle for each process, timing each request by its index within its trace,
+    with zero keeping the original timestamps.
+    :type rate: float
+    :return: If the file was merged successfully.
+    :rtype: bool
+    """
+    # Ensure all values are valid.
+    if not traces:
+        logging.error("No traces to merge.")
+        return False
+    rebase = max(rebase, 0)
+    rate = max(rate, 0)
+    if not output.endswith(".stl"):
+        logging.warning(f"Output path '{output}' did not have a '.stl' extension; appending it.")
+        output = f"{output}.stl"
+    # Opening the output would truncate it before it could be read.
+    real = os.path.realpath(output)
+    for trace in traces:
+        if os.path.realpath(trace) == real:
+            logging.error(f"Output file '{output}' is also an input.")
+            return False
+    logging.info(f"Traces = {len(traces)} | Rebase = {rebase} MB | Rate = {rate if rate > 0 else 'Original'}")
+    count = 0
+    # Write to a temporary file first so a failed merge never leaves a truncated trace at the output path.
+    temporary = f"{output}.part"
+    try:
+        with ExitStack() as stack:
+            readers = [read_trace(stack.enter_context(open(trace, "r")), process, rebase, rate)
+                       for process, trace in enumerate(traces)]
+            try:
+                folder = os.path.dirname(output)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                outfile = stack.enter_context(open(temporary, "w"))
+            except OSError as e:
+                logging.error(f"Could not open output file '{output}': {e}")
+                return False
+            # The heap only ever holds the next request of each trace, with ties going to the lower process index.
+            for timestamp, _, operation, address, rest in heapq.merge(*readers, key=lambda x: (x[0], x[1])):
+                outfile.write(f"{timestamp}:\t{operation}\t{hex(address)}{rest}\n")
+                count += 1
+        os.replace(temporary, output)
+    except Exception as e:
+        if isinstance(e, FileNotFoundError) and e.filename in traces:
+            logging.error(f"Input file '{e.filename}' not found.")
+        else:
+            logging.error(e)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+    logging.info(f"Finished merging {count} requests to '{output}'.")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-Core Memory Trace Merger")
+    parser.add_argument("traces", type=str, nargs="+", help="Trace file paths to merge.")
+    parser.add_argument("-o", "--output", type=str, default=MERGED, help="Output file path.")
+    parser.add_argument("-b", "--rebase", type=int, default=REBASE,
+                        help="Megabytes to rebase the addresses of each process by.")
+    parser.add_argument("-r", "--rate", type=float, default=RATE,
+                        help="Target requests per clock cycle per process, timing each request by its index.")
+    parser.add_argument("-l", "--level", type=str, default=LEVEL, help="Logging level.")
+    args = parser.parse_args()
+    logs(args.level)
+    merge_traces(args.traces, args.output, args.rebase, args.rate)
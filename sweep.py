@@ -0,0 +1,478 @@
+import argparse
+import csv
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
+
+from common import CONFIGS, DRAM_SYS, HOME, LEVEL, logs
+from configuration import Configuration
+from genetic_algorithm import ADDRESS_MAPPINGS, CLK_SPEEDS, MC_CONFIGS, MEM_SPECS, SIM_CONFIGS, TRACES
+
+# Where to save the results to.
+RESULT = os.path.join(HOME, "sweep.csv")
+
+# Number of configurations to run at once.
+WORKERS = os.cpu_count() or 1
+
+# The columns of the results table, with the components first and the metrics after, followed by a column for the
+# run time of each trace.
+COMPONENTS = ["address_mapping", "mc_config", "mem_spec", "sim_config", "clk_mhz"]
+METRICS = ["average", "successful"]
+
+# Memory standards which can be detected from file names, with longer names first so "lpddr4" is not read as "ddr4".
+STANDARDS = ["lpddr5", "lpddr4", "gddr6", "gddr5x", "gddr5", "hbm3", "hbm2", "wideio2", "wideio", "sttmram", "ddr5",
+             "ddr4", "ddr3"]
+
+# A point of the sweep in the same order as the components.
+Point = tuple[str, str, str, str, int]
+
+
+def standard(
+        name: str
+) -> str | None:
+    """
+    Detect the memory standard a component file is for from its name.
+    :param name: The component file name.
+    :type name: str
+    :return: The memory standard or nothing if it could not be detected.
+    :rtype: str | None
+    """
+    name = os.path.basename(name).lower().replace("-", "").replace("_", "")
+    for s in STANDARDS:
+        if s in name:
+            return s
+    return None
+
+
+def compatible_pair(
+        address_mapping: str,
+        mem_spec: str
+) -> bool:
+    """
+    Check if an address mapping and memory specification could possibly run together, being conservative so only pairs
+    known to be incompatible are rejected.
+    :param address_mapping: The address mapping.
+    :type address_mapping: str
+    :param mem_spec: The memory specification.
+    :type mem_spec: str
+    :return: False if the address mapping and memory specification are for different memory standards.
+    :rtype: bool
+    """
+    a = standard(address_mapping)
+    m = standard(mem_spec)
+    return a is None or m is None or a == m
+
+
+def complete_size(
+        result: str
+) -> int:
+    """
+    Get the size of a results file up to and including its last newline, leaving out any partially written final line.
+    :param result: The results file path.
+    :type result: str
+    :return: The size in bytes of the completely written lines.
+    :rtype: int
+    """
+    if not os.path.exists(result):
+        return 0
+    with open(result, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # Read backwards in blocks until the last newline is found.
+        while position > 0:
+            size = min(4096, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                return position + newline + 1
+    return 0
+
+
+def load_results(
+        result: str = RESULT,
+        retry_failed: bool = False
+) -> dict[Point, dict[str, str]]:
+    """
+    Load previously saved results so they can be skipped, only keeping rows which were completely written.
+    :param result: The results file path.
+    :type result: str
+    :param retry_failed: If rows where any trace failed to run should be left out so they are run again.
+    :type retry_failed: bool
+    :return: The saved rows by their point.
+    :rtype: dict[Point, dict[str, str]]
+    """
+    rows = {}
+    if not os.path.exists(result):
+        return rows
+    # A final line without a newline was cut off by an interruption, even if every field looks valid.
+    complete = complete_size(result) == os.path.getsize(result)
+    last = None
+    with open(result, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        traces = (reader.fieldnames or [])[len(COMPONENTS) + len(METRICS):]
+        for row in reader:
+            last = None
+            try:
+                # Missing fields are filled with nothing, so any row cut short by an interruption is rejected here.
+                if None in row.values() or None in row:
+                    raise ValueError("missing fields")
+                point = (row["address_mapping"], row["mc_config"], row["mem_spec"], row["sim_config"],
+                         int(row["clk_mhz"]))
+                float(row["average"])
+                successful = int(row["successful"])
+                for trace in traces:
+                    float(row[trace])
+            except (KeyError, TypeError, ValueError):
+                # A partially written final line from an interruption, which will be run again.
+                logging.debug(f"Skipping malformed row in '{result}': {row}")
+                continue
+            if retry_failed and successful < len(traces):
+                logging.debug(f"Retrying failed row in '{result}': {row}")
+                continue
+            rows[point] = row
+            last = point
+    if not complete and last is not None:
+        rows.pop(last)
+    return rows
+
+
+def enumerate_points(
+        address_mappings: list[str],
+        mc_configs: list[str],
+        mem_specs: list[str],
+        sim_configs: list[str],
+        clk_speeds: list[int],
+        cached: dict[Point, dict[str, str]] | None = None,
+        pair_check: Callable[[str, str], bool] = compatible_pair
+) -> Iterator[Point]:
+    """
+    Lazily enumerate every point of the sweep which still needs to be run.
+    :param address_mappings: The address mappings.
+    :type address_mappings: list[str]
+    :param mc_configs: The MC configurations.
+    :type mc_configs: list[str]
+    :param mem_specs: The memory specifications.
+    :type mem_specs: list[str]
+    :param sim_configs: The sim configurations.
+    :type sim_configs: list[str]
+    :param clk_speeds: The clock speeds.
+    :type clk_speeds: list[int]
+    :param cached: Points which already have results.
+    :type cached: dict[Point, dict[str, str]] | None
+    :param pair_check: Whether an address mapping and memory specification could possibly run together.
+    :type pair_check: Callable[[str, str], bool]
+    :return: The points which need to be run.
+    :rtype: Iterator[Point]
+    """
+    cached = {} if cached is None else cached
+    # Loop over the address mappings and memory specifications first so incompatible pairs prune whole subtrees.
+    for address_mapping, mem_spec in itertools.product(address_mappings, mem_specs):
+        if not pair_check(address_mapping, mem_spec):
+            logging.debug(f"Pruning incompatible '{address_mapping}' and '{mem_spec}'.")
+            continue
+        for mc_config, sim_config, clk_mhz in itertools.product(mc_configs, sim_configs, clk_speeds):
+            point = (address_mapping, mc_config, mem_spec, sim_config, clk_mhz)
+            if point not in cached:
+                yield point
+
+
+def trace_name(
+        trace: str
+) -> str:
+    """
+    Get the name of a trace as used for its results column.
+    :param trace: The trace.
+    :type trace: str
+    :return: The name of the trace.
+    :rtype: str
+    """
+    return os.path.basename(trace).replace(".stl", "")
+
+
+def run_point(
+        index: int,
+        point: Point,
+        traces: list[str] | str,
+        configs_root: str = CONFIGS,
+        dram_sys: str = DRAM_SYS,
+        stop: threading.Event | None = None
+) -> tuple[float, int, dict[str, float]]:
+    """
+    Run a single point of the sweep.
+    :param index: A unique index so concurrent runs do not write to the same configuration file.
+    :type index: int
+    :param point: The point.
+    :type point: Point
+    :param traces: The traces.
+    :type traces: list[str] | str
+    :param configs_root: Where to save configuration files to.
+    :type configs_root: str
+    :param dram_sys: The executable path.
+    :type dram_sys: str
+    :param stop: When set, no further traces are started.
+    :type stop: threading.Event | None
+    :return: The average run time, the number of runs which were successful, and lastly the run time of each trace.
+    :rtype: tuple[float, int, dict[str, float]]
+    """
+    if isinstance(traces, str):
+        traces = [traces]
+    c = Configuration(f"sweep-{index}", *point)
+    times = {}
+    # Run one trace at a time so an interruption does not start any more simulations.
+    for trace in traces:
+        if stop is not None and stop.is_set():
+            break
+        result, _, _ = c.run(trace, True, configs_root, dram_sys)
+        times[trace_name(trace)] = result
+    successful = [t for t in times.values() if t != float("inf")]
+    average = float("inf") if len(successful) < 1 else float(sum(successful)) / len(successful)
+    return average, len(successful), times
+
+
+def sweep(
+        address_mappings: list[str] = ADDRESS_MAPPINGS,
+        mc_configs: list[str] = MC_CONFIGS,
+        mem_specs: list[str] = MEM_SPECS,
+        sim_configs: list[str] = SIM_CONFIGS,
+        clk_speeds: list[int] = CLK_SPEEDS,
+        traces: list[str] | str = TRACES,
+        result: str = RESULT,
+        workers: int = WORKERS,
+        configs_root: str = CONFIGS,
+        dram_sys: str = DRAM_SYS,
+        retry_failed: bool = False
+) -> int:
+    """
+    Run every remaining point of the sweep, appending each result as it finishes so an interrupted sweep can resume.
+    :param address_mappings: The address mappings.
+    :type address_mappings: list[str]
+    :param mc_configs: The MC configurations.
+    :type mc_configs: list[str]
+    :param mem_specs: The memory specifications.
+    :type mem_specs: list[str]
+    :param sim_configs: The sim configurations.
+    :type sim_configs: list[str]
+    :param clk_speeds: The clock speeds.
+    :type clk_speeds: list[int]
+    :param traces: The traces.
+    :type traces: list[str] | str
+    :param result: The results file path.
+    :type result: str
+    :param workers: Number of configurations to run at once.
+    :type workers: int
+    :param configs_root: Where to save configuration files to.
+    :type configs_root: str
+    :param dram_sys: The executable path.
+    :type dram_sys: str
+    :param retry_failed: If points where any trace failed to run should be run again.
+    :type retry_failed: bool
+    :return: The number of points which were run.
+    :rtype: int
+    """
+    workers = max(workers, 1)
+    # Failures from the environment would otherwise be saved as results for every point.
+    if not os.path.isdir(configs_root):
+        logging.error(f"Configurations folder '{configs_root}' does not exist.")
+        return 0
+    if not os.path.isfile(dram_sys) or not os.access(dram_sys, os.X_OK):
+        logging.error(f"DRAMSys executable '{dram_sys}' does not exist or cannot be executed.")
+        return 0
+    if isinstance(traces, str):
+        traces = [traces]
+    # Traces are listed in whatever order the file system gives, so sort them for a stable header.
+    names = sorted(set(trace_name(trace) for trace in traces))
+    header = COMPONENTS + METRICS + names
+    new = not os.path.exists(result) or os.path.getsize(result) == 0
+    if not new:
+        with open(result, "r", newline="") as f:
+            existing = next(csv.reader(f), [])
+        # Averages over a different set of traces cannot be compared, so they cannot be resumed from.
+        fixed = len(COMPONENTS) + len(METRICS)
+        if existing[:fixed] != COMPONENTS + METRICS or sorted(existing[fixed:]) != names:
+            logging.error(f"Results in '{result}' are for columns {existing} rather than {header}; use another path.")
+            return 0
+        # Keep writing in the order of the existing columns.
+        header = existing
+        names = existing[fixed:]
+        # Remove a partially written final line from an interruption so it is run again.
+        size = complete_size(result)
+        if size < os.path.getsize(result):
+            with open(result, "r+b") as f:
+                f.truncate(size)
+    total = len(address_mappings) * len(mc_configs) * len(mem_specs) * len(sim_configs) * len(clk_speeds)
+    cached = load_results(result, retry_failed)
+    logging.info(f"{total} configurations | {len(cached)} cached | Workers = {workers}")
+    points = enumerate_points(address_mappings, mc_configs, mem_specs, sim_configs, clk_speeds, cached)
+    count = 0
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    with open(result, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(header)
+            f.flush()
+        pending: dict[Future, Point] = {}
+
+        def record(future: Future) -> None:
+            """
+            Write the result of a finished point, skipping any which raised so they are run again when resuming.
+            :param future: The finished point.
+            :type future: Future
+            :return: Nothing.
+            :rtype: None
+            """
+            nonlocal count
+            point = pending.pop(future)
+            try:
+                average, successful, times = future.result()
+            except Exception as e:
+                logging.error(f"Failed to run {point}: {e}")
+                return None
+            writer.writerow(list(point) + [average, successful] + [times.get(name, float("inf")) for name in names])
+            f.flush()
+            count += 1
+            logging.info(f"Ran {count} | {point} | Average = {average}")
+            return None
+
+        index = 0
+        try:
+            while True:
+                # Only keep a bounded number of points in flight so the enumeration stays lazy.
+                for point in itertools.islice(points, workers * 2 - len(pending)):
+                    pending[executor.submit(run_point, index, point, traces, configs_root, dram_sys,
+                                                   stop)] = point
+                    index += 1
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future)
+        except KeyboardInterrupt:
+            # Simulations are interrupted too, so nothing finishing from here on can be trusted and is not recorded.
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            logging.warning(f"Interrupted with {len(pending)} points unfinished; run again to resume. "
+                            f"Points which were running stop once their current simulation ends.")
+            logging.info(f"Results saved to '{result}'.")
+            return count
+    executor.shutdown()
+    logging.info(f"Results saved to '{result}'.")
+    return count
+
+
+def sort_results(
+        result: str = RESULT,
+        metric: str = "average",
+        descending: bool = False
+) -> list[dict[str, str]]:
+    """
+    Sort the results by any column.
+    :param result: The results file path.
+    :type result: str
+    :param metric: The column to sort by.
+    :type metric: str
+    :param descending: If the largest values should come first.
+    :type descending: bool
+    :return: The sorted rows, with nothing if the column is unknown.
+    :rtype: list[dict[str, str]]
+    """
+    rows = list(load_results(result).values())
+    if rows and metric not in rows[0]:
+        logging.error(f"Unknown metric '{metric}'; options are {list(rows[0].keys())}.")
+        return []
+
+    def key(row: dict[str, str]) -> tuple[int, float | str]:
+        """
+        Sort numerically when possible, keeping any text values after the numbers.
+        :param row: The row.
+        :type row: dict[str, str]
+        :return: If the value is text and the value itself.
+        :rtype: tuple[int, float | str]
+        """
+        try:
+            return 0, float(row[metric])
+        except (TypeError, ValueError):
+            return 1, str(row[metric])
+
+    rows.sort(key=key, reverse=descending)
+    return rows
+
+
+def export_results(
+        result: str = RESULT,
+        output: str | None = None
+) -> bool:
+    """
+    Export the results to a Parquet file.
+    :param result: The results file path.
+    :type result: str
+    :param output: The Parquet file path, defaulting to the results file path with a '.parquet' extension.
+    :type output: str | None
+    :return: If the file was exported successfully.
+    :rtype: bool
+    """
+    try:
+        import pandas
+    except ImportError:
+        logging.error("Exporting to Parquet requires 'pandas' and 'pyarrow' to be installed.")
+        return False
+    if output is None:
+        output = f"{os.path.splitext(result)[0]}.parquet"
+    try:
+        pandas.read_csv(result).to_parquet(output, index=False)
+    except Exception as e:
+        logging.error(e)
+        return False
+    logging.info(f"Exported results to '{output}'.")
+    return True
+
+
+def restrict(
+        options: list,
+        patterns: list[str] | None
+) -> list:
+    """
+    Restrict the options of a component to those containing any of the patterns.
+    :param options: The options.
+    :type options: list
+    :param patterns: The patterns, with nothing keeping every option.
+    :type patterns: list[str] | None
+    :return: The restricted options.
+    :rtype: list
+    """
+    if not patterns:
+        return options
+    return [o for o in options if any(p in os.path.basename(str(o)) for p in patterns)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DRAMSys Exhaustive Sweep")
+    parser.add_argument("-a", "--address-mappings", type=str, nargs="+", help="Address mappings to restrict to.")
+    parser.add_argument("-c", "--mc-configs", type=str, nargs="+", help="MC configurations to restrict to.")
+    parser.add_argument("-m", "--mem-specs", type=str, nargs="+", help="Memory specifications to restrict to.")
+    parser.add_argument("-s", "--sim-configs", type=str, nargs="+", help="Sim configurations to restrict to.")
+    parser.add_argument("-k", "--clk-speeds", type=int, nargs="+", default=CLK_SPEEDS, help="Clock speeds.")
+    parser.add_argument("-o", "--output", type=str, default=RESULT, help="Results file path.")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS, help="Number of configurations to run at once.")
+    parser.add_argument("--sort", type=str, default="average", help="Column to sort the results by.")
+    parser.add_argument("--descending", action="store_true", help="Sort with the largest values first.")
+    parser.add_argument("--retry-failed", action="store_true", help="Run points where any trace failed again.")
+    parser.add_argument("--parquet", action="store_true", help="Also export the results to Parquet.")
+    parser.add_argument("-l", "--level", type=str, default=LEVEL, help="Logging level.")
+    args = parser.parse_args()
+    logs(args.level)
+    columns = COMPONENTS + METRICS + sorted(set(trace_name(trace) for trace in TRACES))
+    if args.sort not in columns:
+        parser.error(f"Unknown sort column '{args.sort}'; options are {columns}.")
+    sweep(restrict(ADDRESS_MAPPINGS, args.address_mappings), restrict(MC_CONFIGS, args.mc_configs),
+          restrict(MEM_SPECS, args.mem_specs), restrict(SIM_CONFIGS, args.sim_configs), args.clk_speeds,
+          TRACES, args.output, args.workers, retry_failed=args.retry_failed)
+    for i, r in enumerate(sort_results(args.output, args.sort, args.descending)[:10]):
+        logging.info(f"{i + 1} | {args.sort} = {r.get(args.sort)} | {', '.join(r[c] for c in COMPONENTS)}")
+    if args.parquet:
+        export_results(args.output)